@@ -1,19 +1,283 @@
+import asyncio
+import hashlib
+import hmac
+import os
+import queue
+import re
 import sqlite3
+import threading
 import bcrypt
-from typing import Optional, List, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from contextlib import contextmanager
+from itertools import product
+from typing import Optional, List, Dict, Any, Iterable, Iterator, Tuple
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "10"))  # bcrypt's own default (12) costs ~4x per login
+BCRYPT_WORKERS = int(os.getenv("BCRYPT_WORKERS", str(os.cpu_count() or 1)))  # concurrent hashes
+POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", "8"))  # connections kept warm per NoteDatabase
+BUSY_TIMEOUT_MS = 5000
+OPTIMIZE_EVERY = 1000  # writes between PRAGMA optimize runs
+# applied once when a pooled connection opens; they persist for its lifetime
+_CONNECTION_PRAGMAS = (
+    "PRAGMA foreign_keys = ON;",
+    "PRAGMA page_size = 4096;",  # only takes effect on a new, empty database
+    "PRAGMA journal_mode = WAL;",
+    "PRAGMA synchronous = NORMAL;",
+    "PRAGMA temp_store = MEMORY;",
+    "PRAGMA cache_size = -65536;",  # 64 MiB page cache
+    "PRAGMA mmap_size = 268435456;",  # serve reads from a 256 MiB memory map
+    f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS};",
+)
+VERIFIED_LOGIN_CACHE_SIZE = 1024  # usernames whose last good password digest is remembered
+STATEMENT_CACHE_SIZE = 256  # sqlite3 default is 128 prepared statements per connection
+NOTE_PREVIEW_CHARS = 100  # characters of content shown per note in list views
+SEARCH_PREVIEW_CHARS = 150  # longer previews for search hits
+_BCRYPT_COST = re.compile(rb"^\$2[abxy]?\$(\d\d)\$")  # bcrypt hash prefix; group 1 is the cost factor
+_TAG_SEP = chr(31)  # GROUP_CONCAT separator; unit separator never appears in tag names
+
+# hot CRUD statements; sqlite3 caches prepared plans keyed by this text
+_SQL_USER_HASH = "SELECT password_hash FROM users WHERE username = ?"
+_SQL_USER_ID = "SELECT id FROM users WHERE username = ?"
+_SQL_INSERT_USER = "INSERT INTO users (username, password_hash) VALUES (?, ?)"
+_SQL_INSERT_FOLDER = "INSERT INTO folders (user_id, name, parent_id) VALUES (?, ?, ?)"
+_SQL_USER_FOLDERS = "SELECT id, name, parent_id FROM folders WHERE user_id = ? ORDER BY name, id"
+_SQL_INSERT_NOTE = "INSERT INTO notes (user_id, title, content, folder_id) VALUES (?, ?, ?, ?)"
+_SQL_INSERT_NOTE_IGNORE = "INSERT OR IGNORE INTO notes (user_id, title, content, folder_id) VALUES (?, ?, ?, ?)"
+_SQL_NOTE_ID = "SELECT id FROM notes WHERE user_id = ? AND title = ?"
+_SQL_UPDATE_NOTE = """
+    UPDATE notes SET content = ?, title = COALESCE(?, title), modified_at = CURRENT_TIMESTAMP
+    WHERE user_id = ? AND title = ?
+"""
+_SQL_TODO_EXISTS = "SELECT 1 FROM todos WHERE id = ? AND user_id = ?"
+_SQL_FOLDER_EXISTS = "SELECT 1 FROM folders WHERE id = ? AND user_id = ?"
+_SQL_INSERT_TODO = """
+    INSERT INTO todos (user_id, title, description, due_date, priority, note_id)
+    VALUES (?, ?, ?, ?, ?, (SELECT id FROM notes WHERE user_id = ? AND title = ?))
+"""
+_SQL_TOGGLE_TODO = "UPDATE todos SET completed = NOT completed WHERE id = ? AND user_id = ? RETURNING completed"
+_SQL_INSERT_TAG = "INSERT OR IGNORE INTO tags (name) VALUES (?)"
+_SQL_LINK_NOTE_TAG = "INSERT OR IGNORE INTO note_tags (note_id, tag_id) VALUES (?, ?)"
+_SQL_LINK_TODO_TAG = "INSERT OR IGNORE INTO todo_tags (todo_id, tag_id) VALUES (?, ?)"
+_SQL_NOTE_TAGS = "SELECT t.name FROM tags t JOIN note_tags nt ON nt.tag_id = t.id WHERE nt.note_id = ? ORDER BY t.name"
+_SQL_TODO_TAGS = "SELECT t.name FROM tags t JOIN todo_tags tt ON tt.tag_id = t.id WHERE tt.todo_id = ? ORDER BY t.name"
+
+def _preview_sql(chars: int) -> str:
+    # trims content in SQL so full note bodies are never copied out for list views
+    return f"""CASE WHEN length(n.content) > {chars}
+               THEN substr(n.content, 1, {chars}) || '...' ELSE n.content END AS preview"""
+
+
+# whitelist of selectable note fields -> SQL expression (tags are aggregated from note_tags)
+_NOTE_COLUMNS = {
+    "id": "n.id",
+    "title": "n.title",
+    "content": "n.content",
+    "created_at": "n.created_at",
+    "modified_at": "n.modified_at",
+    "folder_id": "n.folder_id",
+    "tags": "GROUP_CONCAT(t.name, CHAR(31)) AS tags",
+    "preview": _preview_sql(NOTE_PREVIEW_CHARS),
+}
+NOTE_FIELDS = ("id", "title", "content", "created_at", "modified_at", "folder_id", "tags")
+# list views get a trimmed preview built in SQL, so full bodies never leave the database
+NOTE_LIST_FIELDS = ("id", "title", "created_at", "modified_at", "folder_id", "tags", "preview")
+
+
+def _note_base_columns(fields: Iterable[str]) -> List[str]:
+    # notes columns the selected fields read; id and modified_at always order the page
+    cols = {"id", "modified_at"}
+    for f in fields:
+        if f == "preview":
+            cols.add("content")
+        elif f != "tags":
+            cols.add(f)
+    return sorted(cols)
+
+
+_SQL_SEARCH_NOTES = f"""
+    SELECT n.id, n.title, n.created_at, n.modified_at, n.folder_id, {_preview_sql(SEARCH_PREVIEW_CHARS)}
+    FROM notes_fts f
+    JOIN notes n ON n.id = f.rowid
+    WHERE notes_fts MATCH ? AND n.user_id = ?
+    ORDER BY f.rank
+    LIMIT ? OFFSET ?
+"""
+
+_TODO_STATUS_SQL = {None: "", "completed": " AND td.completed = 1", "pending": " AND td.completed = 0"}
+
+
+# tags per todo from its todo_tags primary key; no GROUP BY, so the todo scan itself can stay on
+# idx_todos_user_completed_created
+_TODO_TAGS = """(SELECT GROUP_CONCAT(t.name, CHAR(31)) FROM todo_tags tt JOIN tags t ON t.id = tt.tag_id
+                WHERE tt.todo_id = td.id) AS tags"""
+_TODO_COLUMNS = f"""td.id, td.title, td.description, td.due_date, td.priority, td.completed,
+               td.created_at, n.title AS note_title, {_TODO_TAGS}"""
+# exactly the keys the todo list endpoint returns, in its order
+_TODO_LIST_COLUMNS = f"""td.id, td.title, td.due_date, td.priority, td.completed,
+               {_TODO_TAGS}, n.title AS note_title"""
+
+
+def _todo_query(columns: str, status: Optional[str], by_priority: bool, by_note: bool, by_tag: bool) -> str:
+    where = "td.user_id = ?" + _TODO_STATUS_SQL[status]
+    if by_priority:
+        where += " AND td.priority = ?"
+    if by_note:
+        where += " AND n.title = ?"
+    if by_tag:
+        where += (" AND EXISTS (SELECT 1 FROM todo_tags ft JOIN tags fg ON fg.id = ft.tag_id"
+                  " WHERE ft.todo_id = td.id AND fg.name = ?)")
+    return f"""
+        SELECT {columns}
+        FROM todos td
+        LEFT JOIN notes n ON n.id = td.note_id
+        WHERE {where}
+        ORDER BY td.completed, td.due_date IS NULL, td.due_date, td.id
+    """
+
+
+# every filter combination is assembled once; params bind in (user_id, priority, note, tag) order
+_TODO_FILTER_KEYS = list(product(_TODO_STATUS_SQL, (False, True), (False, True), (False, True)))
+_SQL_TODOS = {key: _todo_query(_TODO_COLUMNS, *key) for key in _TODO_FILTER_KEYS}
+_SQL_TODO_LIST = {key: _todo_query(_TODO_LIST_COLUMNS, *key) for key in _TODO_FILTER_KEYS}
+
+
+def _split_tags(joined: Optional[str]) -> List[str]:
+    return joined.split(_TAG_SEP) if joined else []
+
+
+def _fts_query(query: str) -> str:
+    # each word becomes a quoted prefix term, so user input is never parsed as FTS5 syntax
+    return " ".join('"' + w.replace('"', '""') + '"*' for w in query.split())
+
+
+def _optimize(conn: sqlite3.Connection):
+    # ANALYZE writes sqlite_stat1, so callers hold the write lock; statistics are best-effort
+    try:
+        conn.execute("PRAGMA optimize")
+    except sqlite3.Error:
+        pass
+
+
+class _ConnectionPool:
+    # LIFO so the most recently used (cache-warm) connection is handed out first
+    def __init__(self, factory, size: int):
+        self._factory = factory
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue(maxsize=size)
+        self._slots = threading.BoundedSemaphore(size)
+        self._all: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+    @contextmanager
+    def acquire(self):
+        self._slots.acquire()
+        if self._closed:
+            self._slots.release()
+            raise sqlite3.ProgrammingError("Cannot operate on a closed connection pool.")
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            try:
+                conn = self._factory()
+            except BaseException:
+                self._slots.release()  # a failed open must not leak its slot
+                raise
+            with self._lock:
+                if not self._closed:
+                    self._all.append(conn)
+            if self._closed:  # close() ran while this connection was opening
+                conn.close()
+                self._slots.release()
+                raise sqlite3.ProgrammingError("Cannot operate on a closed connection pool.")
+        try:
+            yield conn
+        finally:
+            if not self._closed:  # close() already closed it; don't queue it for reuse
+                self._idle.put_nowait(conn)
+            self._slots.release()
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            for conn in self._all:
+                _optimize(conn)
+                conn.close()
+            self._all.clear()
+        # drop the closed connections from the idle queue so nothing can hand them out
+        while True:
+            try:
+                self._idle.get_nowait()
+            except queue.Empty:
+                break
 
 
 class NoteDatabase:
-    def __init__(self, db_path: str = "notes.db"):
+    def __init__(self, db_path: str = "notes.db", bcrypt_rounds: int = BCRYPT_ROUNDS):
         self.db_path = db_path
+        self._bcrypt_rounds = bcrypt_rounds
+        self._lock = threading.RLock()  # guards the in-process caches below
+        # SQLite allows one writer at a time; serializing writers here avoids busy-waiting in SQLite
+        self._write_lock = threading.Lock()
+        self._writes = 0  # guarded by _write_lock
+        self._uid_cache: Dict[str, int] = {}  # username -> id; usernames never change
+        # username -> HMAC(pepper, password) of the last successful bcrypt check; the pepper
+        # never leaves the process, so repeat logins skip bcrypt without storing anything reusable
+        self._pepper = os.urandom(32)
+        self._verified: "OrderedDict[str, bytes]" = OrderedDict()
+        # bcrypt releases the GIL, so a bounded pool hashes in parallel without blocking callers
+        self._bcrypt_pool = ThreadPoolExecutor(max_workers=BCRYPT_WORKERS, thread_name_prefix="bcrypt")
+        # an in-memory database exists per connection, so it can only be shared through one
+        self._pool = _ConnectionPool(self._connect, 1 if db_path == ":memory:" else POOL_SIZE)
         self._init_database()
+        # verified against when the username is unknown, so a miss costs the same as a wrong password;
+        # hashes at any other cost are rewritten at this one on their next login (see _rehash_needed)
+        self._dummy_hash = self._hash_password("dummy-password")
 
     # ---------- helpers ----------
     def _connect(self):
-        conn = sqlite3.connect(self.db_path)
-        conn.execute("PRAGMA foreign_keys = ON;")
+        # pooled connections stay open for the life of the instance
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None,
+                               cached_statements=STATEMENT_CACHE_SIZE)
+        for pragma in _CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        conn.row_factory = sqlite3.Row  # rows map column names in C; read methods alias columns to output keys
         return conn
 
+    def close(self):
+        self._bcrypt_pool.shutdown(wait=False)
+        with self._write_lock:  # the final PRAGMA optimize runs as the only writer too
+            self._pool.close()
+
+    def _read(self):
+        # WAL lets readers on separate pooled connections run alongside the writer
+        return self._pool.acquire()
+
+    @contextmanager
+    def _write(self):
+        # single autocommit statement; one writer at a time
+        with self._write_lock, self._pool.acquire() as conn:
+            yield conn
+            # pooled connections live as long as the process, so planner statistics are refreshed
+            # every OPTIMIZE_EVERY successful writes, while this thread is still the only writer
+            self._writes += 1
+            if self._writes % OPTIMIZE_EVERY == 0:
+                _optimize(conn)
+
+    @contextmanager
+    def _transaction(self):
+        # groups several statements under one BEGIN IMMEDIATE ... COMMIT (a single journal sync)
+        with self._write() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except BaseException:
+                # a failed COMMIT leaves the transaction open; never hand it back to the pool that way
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+
     def _ensure_column(self, conn: sqlite3.Connection, table: str, column: str, decl: str):
         cur = conn.cursor()
         cur.execute(f"PRAGMA table_info({table})")
@@ -22,17 +286,30 @@ class NoteDatabase:
             cur.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
             conn.commit()
 
+    def _ensure_without_rowid(self, c: sqlite3.Cursor, table: str, ddl: str):
+        # tables created before WITHOUT ROWID are rebuilt once, keeping their rows
+        c.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+        row = c.fetchone()
+        if row is None or "WITHOUT ROWID" in row[0].upper():
+            c.execute(ddl)
+            return
+        c.execute(f"ALTER TABLE {table} RENAME TO {table}_rowid")
+        c.execute(ddl)
+        c.execute(f"INSERT OR IGNORE INTO {table} SELECT * FROM {table}_rowid")
+        c.execute(f"DROP TABLE {table}_rowid")
+
     # ---------- schema ----------
     def _init_database(self):
-        conn = self._connect()
-        c = conn.cursor()
+        with self._transaction() as conn:
+            self._create_schema(conn.cursor())
 
+    def _create_schema(self, c: sqlite3.Cursor):
         # Users
         c.execute("""
         CREATE TABLE IF NOT EXISTS users (
           id INTEGER PRIMARY KEY AUTOINCREMENT,
           username TEXT UNIQUE NOT NULL,
-          password_hash TEXT NOT NULL,
+          password_hash BLOB NOT NULL,
           created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
         """)
@@ -74,15 +351,15 @@ class NoteDatabase:
         )
         """)
 
-        # Note-Tag
-        c.execute("""
+        # Note-Tag (clustered on its composite key, no separate rowid b-tree)
+        self._ensure_without_rowid(c, "note_tags", """
         CREATE TABLE IF NOT EXISTS note_tags (
-          note_id INTEGER,
-          tag_id INTEGER,
+          note_id INTEGER NOT NULL,
+          tag_id INTEGER NOT NULL,
           PRIMARY KEY (note_id, tag_id),
           FOREIGN KEY (note_id) REFERENCES notes(id) ON DELETE CASCADE,
           FOREIGN KEY (tag_id) REFERENCES tags(id) ON DELETE CASCADE
-        )
+        ) WITHOUT ROWID
         """)
 
         # Todos
@@ -103,14 +380,14 @@ class NoteDatabase:
         """)
 
         # Todo-Tag
-        c.execute("""
+        self._ensure_without_rowid(c, "todo_tags", """
         CREATE TABLE IF NOT EXISTS todo_tags (
-          todo_id INTEGER,
-          tag_id INTEGER,
+          todo_id INTEGER NOT NULL,
+          tag_id INTEGER NOT NULL,
           PRIMARY KEY (todo_id, tag_id),
           FOREIGN KEY (todo_id) REFERENCES todos(id) ON DELETE CASCADE,
           FOREIGN KEY (tag_id) REFERENCES tags(id) ON DELETE CASCADE
-        )
+        ) WITHOUT ROWID
         """)
 
         # Reminders
@@ -125,103 +402,454 @@ class NoteDatabase:
         )
         """)
 
+        # Full-text index over notes (external content, kept in sync by triggers)
+        c.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'notes_fts'")
+        fts_exists = c.fetchone() is not None
+        c.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(
+          title, content, content='notes', content_rowid='id', tokenize='unicode61'
+        )
+        """)
+        c.execute("""
+        CREATE TRIGGER IF NOT EXISTS notes_fts_ai AFTER INSERT ON notes BEGIN
+          INSERT INTO notes_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+        END
+        """)
+        c.execute("""
+        CREATE TRIGGER IF NOT EXISTS notes_fts_ad AFTER DELETE ON notes BEGIN
+          INSERT INTO notes_fts(notes_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+        END
+        """)
+        c.execute("""
+        CREATE TRIGGER IF NOT EXISTS notes_fts_au AFTER UPDATE OF title, content ON notes BEGIN
+          INSERT INTO notes_fts(notes_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+          INSERT INTO notes_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+        END
+        """)
+        if not fts_exists:
+            c.execute("INSERT INTO notes_fts(notes_fts) VALUES ('rebuild')")
+
         # Indexes
-        c.execute('CREATE INDEX IF NOT EXISTS idx_notes_user_id ON notes(user_id)')
-        c.execute('CREATE INDEX IF NOT EXISTS idx_notes_title ON notes(title)')
         c.execute('CREATE INDEX IF NOT EXISTS idx_notes_folder_id ON notes(folder_id)')
-        c.execute('CREATE INDEX IF NOT EXISTS idx_todos_user_id ON todos(user_id)')
         c.execute('CREATE INDEX IF NOT EXISTS idx_folders_user_id ON folders(user_id)')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_folders_parent_id ON folders(parent_id)')
         c.execute('CREATE INDEX IF NOT EXISTS idx_reminders_user_id ON reminders(user_id)')
+        # (user_id, title) lookups use the UNIQUE constraint's autoindex; a title-only index is dead weight
+        c.execute('DROP INDEX IF EXISTS idx_notes_title')
+        # user_id alone is the leading column of the composite indexes below (and of the notes autoindex)
+        c.execute('DROP INDEX IF EXISTS idx_notes_user_id')
+        c.execute('DROP INDEX IF EXISTS idx_todos_user_id')
+        # composite indexes matching the list/filter query shapes
+        c.execute('CREATE INDEX IF NOT EXISTS idx_notes_user_modified ON notes(user_id, modified_at DESC)')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_todos_user_completed_created ON todos(user_id, completed, created_at DESC)')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_note_tags_tag ON note_tags(tag_id, note_id)')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_todo_tags_tag ON todo_tags(tag_id, todo_id)')
 
-        conn.commit()
-        conn.close()
+        # give the planner statistics once; later runs keep the existing sqlite_stat1
+        c.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+        if c.fetchone() is None:
+            c.execute('ANALYZE')
 
     # ---------- AUTH ----------
-    def _hash_password(self, password: str) -> str:
-        return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+    # hashes are stored as raw bytes; rows written before that are still TEXT
+    def _hash_password(self, password: str) -> bytes:
+        return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds=self._bcrypt_rounds))
 
-    def _verify_password(self, password: str, hash: str) -> bool:
-        return bcrypt.checkpw(password.encode("utf-8"), hash.encode("utf-8"))
+    def _verify_password(self, password: str, hash: bytes) -> bool:
+        return bcrypt.checkpw(password.encode("utf-8"), hash)
 
-    def create_user(self, username: str, password: str) -> bool:
-        conn = self._connect()
-        try:
-            conn.execute(
-                "INSERT INTO users (username, password_hash) VALUES (?, ?)",
-                (username, self._hash_password(password)),
-            )
-            conn.commit()
+    def _insert_user(self, username: str, password_hash: bytes) -> bool:
+        with self._write() as conn:
+            try:
+                cur = conn.execute(_SQL_INSERT_USER, (username, password_hash))
+            except sqlite3.IntegrityError:
+                return False
+        with self._lock:
+            self._uid_cache[username] = cur.lastrowid  # written through; the first request after signup skips SQL
+        self._forget_verified(username)
+        return True
+
+    def _set_password_hash(self, username: str, password_hash: bytes) -> bool:
+        # every write of a stored hash goes through here, so a cached login never outlives its hash
+        with self._write() as conn:
+            cur = conn.execute("UPDATE users SET password_hash = ? WHERE username = ?", (password_hash, username))
+        self._forget_verified(username)
+        return cur.rowcount > 0
+
+    def _get_password_hash(self, username: str) -> Optional[bytes]:
+        with self._read() as conn:
+            cur = conn.cursor()
+            cur.execute(_SQL_USER_HASH, (username,))
+            row = cur.fetchone()
+        if not row:
+            return None
+        return row[0] if isinstance(row[0], bytes) else row[0].encode("utf-8")
+
+    def _rehash_needed(self, stored: bytes) -> bool:
+        # $2b$NN$...: NN is the cost; anything unparseable is rewritten too
+        m = _BCRYPT_COST.match(stored)
+        return m is None or int(m.group(1)) != self._bcrypt_rounds
+
+    def _password_digest(self, password: str) -> bytes:
+        return hmac.new(self._pepper, password.encode("utf-8"), hashlib.sha256).digest()
+
+    def _recently_verified(self, username: str, digest: bytes) -> bool:
+        with self._lock:
+            known = self._verified.get(username)
+            if known is None or not hmac.compare_digest(known, digest):
+                return False
+            self._verified.move_to_end(username)
             return True
-        except sqlite3.IntegrityError:
-            return False
-        finally:
-            conn.close()
+
+    def _remember_verified(self, username: str, digest: bytes):
+        with self._lock:
+            self._verified[username] = digest
+            self._verified.move_to_end(username)
+            if len(self._verified) > VERIFIED_LOGIN_CACHE_SIZE:
+                self._verified.popitem(last=False)
+
+    def _forget_verified(self, username: str):
+        with self._lock:
+            self._verified.pop(username, None)
+
+    def create_user(self, username: str, password: str) -> bool:
+        return self._insert_user(username, self._hash_password(password))
 
     def verify_user(self, username: str, password: str) -> bool:
-        conn = self._connect()
-        cur = conn.cursor()
-        cur.execute("SELECT password_hash FROM users WHERE username = ?", (username,))
-        row = cur.fetchone()
-        conn.close()
-        return bool(row and self._verify_password(password, row[0]))
+        digest = self._password_digest(password)
+        if self._recently_verified(username, digest):
+            return True
+        stored = self._get_password_hash(username)
+        ok = self._verify_password(password, stored or self._dummy_hash)
+        if stored and ok:
+            if self._rehash_needed(stored):
+                self._set_password_hash(username, self._hash_password(password))
+            self._remember_verified(username, digest)
+        return bool(stored and ok)
+
+    # bcrypt runs on its own pool; the SQLite steps go to the default executor, since they can wait
+    # on the write lock or a pool slot and must not stall the event loop
+    async def create_user_async(self, username: str, password: str) -> bool:
+        loop = asyncio.get_running_loop()
+        password_hash = await loop.run_in_executor(self._bcrypt_pool, self._hash_password, password)
+        return await asyncio.to_thread(self._insert_user, username, password_hash)
+
+    async def verify_user_async(self, username: str, password: str) -> bool:
+        digest = self._password_digest(password)
+        if self._recently_verified(username, digest):
+            return True
+        stored = await asyncio.to_thread(self._get_password_hash, username)
+        loop = asyncio.get_running_loop()
+        ok = await loop.run_in_executor(self._bcrypt_pool, self._verify_password, password, stored or self._dummy_hash)
+        if stored and ok:
+            if self._rehash_needed(stored):
+                new_hash = await loop.run_in_executor(self._bcrypt_pool, self._hash_password, password)
+                await asyncio.to_thread(self._set_password_hash, username, new_hash)
+            self._remember_verified(username, digest)
+        return bool(stored and ok)
 
     def get_user_id(self, username: str) -> Optional[int]:
-        conn = self._connect()
-        cur = conn.cursor()
-        cur.execute("SELECT id FROM users WHERE username = ?", (username,))
-        row = cur.fetchone()
-        conn.close()
-        return row[0] if row else None
+        with self._lock:
+            uid = self._uid_cache.get(username)
+        if uid is not None:
+            return uid
+        with self._read() as conn:
+            cur = conn.cursor()
+            cur.execute(_SQL_USER_ID, (username,))
+            row = cur.fetchone()
+        if not row:
+            return None  # misses are not cached, so a later signup is seen immediately
+        with self._lock:
+            self._uid_cache[username] = row[0]
+        return row[0]
 
     # ---------- FOLDERS ----------
     def create_folder(self, user_id: int, name: str, parent_id: Optional[int] = None) -> int:
-        conn = self._connect()
-        cur = conn.cursor()
-        cur.execute(
-            "INSERT INTO folders (user_id, name, parent_id) VALUES (?, ?, ?)",
-            (user_id, name, parent_id),
+        with self._write() as conn:
+            cur = conn.cursor()
+            cur.execute(_SQL_INSERT_FOLDER, (user_id, name, parent_id))
+            return cur.lastrowid
+
+    def _collect_descendants(self, conn: sqlite3.Connection, user_id: int, folder_id: int) -> List[int]:
+        cur = conn.execute(
+            """
+            WITH RECURSIVE d(id) AS (
+              SELECT id FROM folders WHERE user_id = ? AND parent_id = ?
+              UNION ALL
+              SELECT f.id FROM folders f JOIN d ON f.parent_id = d.id WHERE f.user_id = ?
+            )
+            SELECT id FROM d
+            """,
+            (user_id, folder_id, user_id),
         )
-        folder_id = cur.lastrowid
-        conn.commit()
-        conn.close()
-        return folder_id
+        return [r[0] for r in cur.fetchall()]
+
+    def delete_folder(self, user_id: int, folder_id: int) -> bool:
+        with self._transaction() as conn:
+            cur = conn.execute(_SQL_FOLDER_EXISTS, (folder_id, user_id))
+            if not cur.fetchone():
+                return False
+            ids = [folder_id] + self._collect_descendants(conn, user_id, folder_id)
+            marks = ",".join("?" * len(ids))
+            # notes are kept but moved out of the deleted subtree
+            conn.execute(f"UPDATE notes SET folder_id = NULL WHERE user_id = ? AND folder_id IN ({marks})",
+                         (user_id, *ids))
+            conn.execute(f"DELETE FROM folders WHERE user_id = ? AND id IN ({marks})", (user_id, *ids))
+            return True
+
+    def rename_folder(self, user_id: int, folder_id: int, name: str) -> bool:
+        with self._write() as conn:
+            cur = conn.execute("UPDATE folders SET name = ? WHERE id = ? AND user_id = ?", (name, folder_id, user_id))
+            return cur.rowcount > 0
+
+    def move_folder(self, user_id: int, folder_id: int, parent_id: Optional[int]) -> bool:
+        # refuses unknown folders, foreign parents and moves that would create a cycle
+        with self._transaction() as conn:
+            if not conn.execute(_SQL_FOLDER_EXISTS, (folder_id, user_id)).fetchone():
+                return False
+            if parent_id is not None:
+                if not conn.execute(_SQL_FOLDER_EXISTS, (parent_id, user_id)).fetchone():
+                    return False
+                if parent_id == folder_id or parent_id in self._collect_descendants(conn, user_id, folder_id):
+                    return False
+            conn.execute("UPDATE folders SET parent_id = ? WHERE id = ? AND user_id = ?", (parent_id, folder_id, user_id))
+            return True
 
     def list_folders_tree(self, user_id: int) -> List[Dict[str, Any]]:
-        conn = self._connect()
-        cur = conn.cursor()
-        cur.execute("SELECT id, name, parent_id FROM folders WHERE user_id = ?", (user_id,))
-        rows = cur.fetchall()
-        conn.close()
-        nodes = {r[0]: {"id": r[0], "name": r[1], "parent_id": r[2], "children": []} for r in rows}
+        with self._read() as conn:
+            cur = conn.cursor()
+            # siblings come out of SQL already ordered by name
+            cur.execute(_SQL_USER_FOLDERS, (user_id,))
+            rows = cur.fetchall()
+        nodes = {r["id"]: dict(r, children=[]) for r in rows}
         roots = []
-        for node in nodes.values():
-            if node["parent_id"] and node["parent_id"] in nodes:
-                nodes[node["parent_id"]]["children"].append(node)
-            else:
-                roots.append(node)
+        get = nodes.get
+        for fid, _, parent_id in rows:
+            parent = get(parent_id)
+            (parent["children"] if parent else roots).append(nodes[fid])
         return roots
 
     # ---------- NOTES ----------
     def create_note(self, user_id: int, title: str, content: str, folder_id: Optional[int] = None) -> Optional[int]:
-        conn = self._connect()
-        try:
-            cur = conn.cursor()
-            cur.execute(
-                "INSERT INTO notes (user_id, title, content, folder_id) VALUES (?, ?, ?, ?)",
-                (user_id, title, content, folder_id),
+        with self._write() as conn:
+            try:
+                cur = conn.cursor()
+                cur.execute(_SQL_INSERT_NOTE, (user_id, title, content, folder_id))
+                return cur.lastrowid
+            except sqlite3.IntegrityError:
+                return None
+
+    def update_note(self, user_id: int, title: str, content: str, new_title: Optional[str] = None) -> bool:
+        # content and optional rename land in one statement / one commit; UNIQUE(user_id, title) rejects a rename clash
+        with self._write() as conn:
+            try:
+                cur = conn.execute(_SQL_UPDATE_NOTE, (content, new_title, user_id, title))
+                return cur.rowcount > 0
+            except sqlite3.IntegrityError:
+                return False
+
+    def delete_note(self, user_id: int, title: str) -> bool:
+        with self._transaction() as conn:
+            row = conn.execute(_SQL_NOTE_ID, (user_id, title)).fetchone()
+            if not row:
+                return False
+            # todos outlive their note; tag links cascade
+            conn.execute("UPDATE todos SET note_id = NULL WHERE note_id = ?", (row[0],))
+            conn.execute("DELETE FROM notes WHERE id = ?", (row[0],))
+            return True
+
+    def set_note_folder(self, user_id: int, title: str, folder_id: Optional[int]) -> bool:
+        with self._transaction() as conn:
+            if folder_id is not None and not conn.execute(_SQL_FOLDER_EXISTS, (folder_id, user_id)).fetchone():
+                return False
+            cur = conn.execute("UPDATE notes SET folder_id = ? WHERE user_id = ? AND title = ?",
+                               (folder_id, user_id, title))
+            return cur.rowcount > 0
+
+    def create_notes_bulk(self, user_id: int, notes: Iterable[Tuple[str, str, Optional[int]]]) -> int:
+        # rows are (title, content, folder_id); duplicate titles are skipped, returns rows inserted
+        with self._transaction() as conn:
+            cur = conn.executemany(
+                _SQL_INSERT_NOTE_IGNORE,
+                [(user_id, title, content, folder_id) for title, content, folder_id in notes],
             )
-            note_id = cur.lastrowid
-            conn.commit()
-            return note_id
-        except sqlite3.IntegrityError:
+            return cur.rowcount
+
+    def iter_user_notes(self, user_id: int, limit: int = 50, fields: Iterable[str] = NOTE_FIELDS,
+                        before: Optional[Tuple[str, int]] = None) -> Iterator[Dict[str, Any]]:
+        # yields notes one by one; callers that don't need `content` can leave it out of `fields`
+        # `before` is a (modified_at, id) keyset cursor: only notes that sort after it are returned
+        wanted = set(fields)
+        unknown = wanted - _NOTE_COLUMNS.keys()
+        if unknown:
+            raise ValueError(f"Unknown note fields: {sorted(unknown)}")
+        names = [f for f in _NOTE_COLUMNS if f in wanted]
+        with_tags = "tags" in wanted
+        page = f"""
+            SELECT {", ".join(_note_base_columns(names))}
+            FROM notes
+            WHERE user_id = ? {"AND (modified_at, id) < (?, ?)" if before else ""}
+            ORDER BY modified_at DESC, id DESC
+            LIMIT ?
+        """
+        # the page is cut on idx_notes_user_modified first; only its rows are joined and grouped
+        sql = f"""
+            SELECT {", ".join(_NOTE_COLUMNS[f] for f in names)}
+            FROM ({page}) n
+            {"LEFT JOIN note_tags nt ON nt.note_id = n.id LEFT JOIN tags t ON t.id = nt.tag_id" if with_tags else ""}
+            {"GROUP BY n.id" if with_tags else ""}
+            ORDER BY n.modified_at DESC, n.id DESC
+        """
+        # the page is at most `limit` rows, so it is fetched whole and the pooled connection goes back
+        # before the first yield; callers may run other queries while iterating
+        with self._read() as conn:
+            rows = conn.execute(sql, (user_id, *(before or ()), limit)).fetchall()
+        for r in rows:
+            note = dict(r)
+            if with_tags:
+                note["tags"] = _split_tags(note["tags"])
+            yield note
+
+    def get_user_notes(self, user_id: int, limit: int = 50, fields: Iterable[str] = NOTE_FIELDS,
+                       before: Optional[Tuple[str, int]] = None) -> List[Dict[str, Any]]:
+        return list(self.iter_user_notes(user_id, limit, fields, before))
+
+    def get_user_notes_list(self, user_id: int, limit: int = 50,
+                            before: Optional[Tuple[str, int]] = None) -> List[Dict[str, Any]]:
+        return self.get_user_notes(user_id, limit, NOTE_LIST_FIELDS, before)
+
+    def get_note_by_title(self, user_id: int, title: str) -> Optional[Dict[str, Any]]:
+        with self._read() as conn:
+            r = conn.execute(
+                """
+                SELECT n.id, n.title, n.content, n.created_at, n.modified_at, n.reminder_date, n.folder_id,
+                       GROUP_CONCAT(t.name, CHAR(31)) AS tags
+                FROM notes n
+                LEFT JOIN note_tags nt ON nt.note_id = n.id
+                LEFT JOIN tags t ON t.id = nt.tag_id
+                WHERE n.user_id = ? AND n.title = ?
+                GROUP BY n.id
+                """,
+                (user_id, title),
+            ).fetchone()
+        if not r:
             return None
-        finally:
-            conn.close()
+        note = dict(r)
+        note["tags"] = _split_tags(note["tags"])
+        return note
 
-    def get_user_notes(self, user_id: int) -> List[Dict[str, Any]]:
-        conn = self._connect()
-        cur = conn.cursor()
-        cur.execute("SELECT id, title, content, folder_id FROM notes WHERE user_id = ?", (user_id,))
-        notes = [{"id": r[0], "title": r[1], "content": r[2], "folder_id": r[3]} for r in cur.fetchall()]
-        conn.close()
-        return notes
+    def search_user_notes(self, user_id: int, query: str, limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
+        with self._read() as conn:
+            cur = conn.execute(_SQL_SEARCH_NOTES, (_fts_query(query), user_id, limit, offset))
+            rows = cur.fetchall()
+        return [dict(r) for r in rows]
+
+    # ---------- TODOS ----------
+    def get_user_todos(self, user_id: int, status: Optional[str] = None, tag: Optional[str] = None,
+                       priority: Optional[str] = None, linked_to_note: Optional[str] = None) -> List[Dict[str, Any]]:
+        return self._query_todos(_SQL_TODOS, user_id, status, tag, priority, linked_to_note)
+
+    def get_user_todos_list(self, user_id: int, status: Optional[str] = None, tag: Optional[str] = None,
+                            priority: Optional[str] = None, linked_to_note: Optional[str] = None) -> List[Dict[str, Any]]:
+        # list-endpoint projection: rows come out already in the response shape
+        return self._query_todos(_SQL_TODO_LIST, user_id, status, tag, priority, linked_to_note)
+
+    def _query_todos(self, variants: Dict[tuple, str], user_id: int, status: Optional[str], tag: Optional[str],
+                     priority: Optional[str], linked_to_note: Optional[str]) -> List[Dict[str, Any]]:
+        if status not in _TODO_STATUS_SQL:
+            status = None
+        sql = variants[(status, bool(priority), bool(linked_to_note), bool(tag))]
+        params = [user_id] + [p for p in (priority, linked_to_note, tag) if p]
+        with self._read() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        todos = [dict(r) for r in rows]
+        for t in todos:
+            t["completed"] = bool(t["completed"])
+            t["tags"] = _split_tags(t["tags"])
+        return todos
+
+    def create_todo(self, user_id: int, title: str, description: str = "", due_date: Optional[str] = None,
+                    priority: str = "normal", note_title: Optional[str] = None,
+                    tags: Optional[List[str]] = None) -> int:
+        # the todo and its tag links commit together
+        with self._transaction() as conn:
+            cur = conn.execute(_SQL_INSERT_TODO, (user_id, title, description, due_date, priority, user_id, note_title))
+            todo_id = cur.lastrowid
+            if tags:
+                conn.executemany(_SQL_LINK_TODO_TAG, [(todo_id, tid) for tid in self._tag_ids(conn, tags)])
+            return todo_id
+
+    def create_todos_bulk(self, user_id: int,
+                          todos: Iterable[Tuple[str, str, Optional[str], str, Optional[str]]]) -> int:
+        # rows are (title, description, due_date, priority, note_title); returns rows inserted
+        with self._transaction() as conn:
+            cur = conn.executemany(
+                _SQL_INSERT_TODO,
+                [(user_id, title, description, due_date, priority, user_id, note_title)
+                 for title, description, due_date, priority, note_title in todos],
+            )
+            return cur.rowcount
+
+    def toggle_todo(self, user_id: int, todo_id: int) -> bool:
+        # flip and confirm ownership in one statement
+        with self._write() as conn:
+            row = conn.execute(_SQL_TOGGLE_TODO, (todo_id, user_id)).fetchone()
+        return row is not None
+
+    def delete_todo(self, user_id: int, todo_id: int) -> bool:
+        with self._write() as conn:
+            cur = conn.execute("DELETE FROM todos WHERE id = ? AND user_id = ?", (todo_id, user_id))
+            return cur.rowcount > 0
+
+    # ---------- TAGS ----------
+    def _tag_ids(self, conn: sqlite3.Connection, names: List[str]) -> List[int]:
+        names = list(dict.fromkeys(names))
+        conn.executemany(_SQL_INSERT_TAG, [(n,) for n in names])
+        marks = ",".join("?" * len(names))
+        return [r[0] for r in conn.execute(f"SELECT id FROM tags WHERE name IN ({marks})", names).fetchall()]
+
+    def add_note_tags(self, user_id: int, title: str, tags: List[str]) -> Optional[List[str]]:
+        with self._transaction() as conn:
+            row = conn.execute(_SQL_NOTE_ID, (user_id, title)).fetchone()
+            if not row:
+                return None
+            note_id = row[0]
+            if tags:
+                conn.executemany(_SQL_LINK_NOTE_TAG, [(note_id, tid) for tid in self._tag_ids(conn, tags)])
+            return [r[0] for r in conn.execute(_SQL_NOTE_TAGS, (note_id,)).fetchall()]
+
+    def add_todo_tags(self, user_id: int, todo_id: int, tags: List[str]) -> Optional[List[str]]:
+        # tags an existing todo; create_todo links the tags given at creation itself
+        with self._transaction() as conn:
+            if not conn.execute(_SQL_TODO_EXISTS, (todo_id, user_id)).fetchone():
+                return None
+            if tags:
+                conn.executemany(_SQL_LINK_TODO_TAG, [(todo_id, tid) for tid in self._tag_ids(conn, tags)])
+            return [r[0] for r in conn.execute(_SQL_TODO_TAGS, (todo_id,)).fetchall()]
+
+    # ---------- STATS ----------
+    def get_user_stats(self, user_id: int) -> Dict[str, Any]:
+        # every count in one statement / one fetch
+        with self._read() as conn:
+            row = conn.execute(
+                """
+                SELECT
+                  (SELECT COUNT(*) FROM notes WHERE user_id = ?1),
+                  (SELECT COUNT(DISTINCT nt.tag_id) FROM note_tags nt
+                     JOIN notes n ON n.id = nt.note_id WHERE n.user_id = ?1),
+                  (SELECT COUNT(*) FROM todos WHERE user_id = ?1),
+                  (SELECT COUNT(*) FROM folders WHERE user_id = ?1),
+                  (SELECT COUNT(*) FROM reminders WHERE user_id = ?1),
+                  (SELECT title FROM notes WHERE user_id = ?1 ORDER BY modified_at DESC LIMIT 1),
+                  (SELECT modified_at FROM notes WHERE user_id = ?1 ORDER BY modified_at DESC LIMIT 1)
+                """,
+                (user_id,),
+            ).fetchone()
+        return {
+            "total_notes": row[0],
+            "total_tags": row[1],
+            "total_todos": row[2],
+            "total_folders": row[3],
+            "total_reminders": row[4],
+            "recent_note": {"title": row[5], "modified_at": row[6]} if row[5] is not None else None,
+        }
@@ -2,16 +2,22 @@
 from fastapi import FastAPI, HTTPException, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import RedirectResponse
 from pydantic import BaseModel, field_validator
-from typing import Optional, List
+from typing import Optional, List, Tuple
+from contextlib import asynccontextmanager
 from datetime import datetime
-import json
 import os
-from .main import NoteDatabaseSystem  # package-relative
+from .main import NoteDatabaseSystem, VALID_PRIORITIES  # package-relative
 
-app = FastAPI(title="Notes & Todos API", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    notes_system.db.close()
+
+app = FastAPI(title="Notes & Todos API", version="1.0.0", lifespan=lifespan)
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # project root
 FRONTEND_DIR = os.path.join(BASE_DIR, "frontend")
@@ -24,16 +30,12 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# compress list/search payloads; small bodies (health, single results) go out as-is
+app.add_middleware(GZipMiddleware, minimum_size=1000, compresslevel=5)
 
 security = HTTPBearer()
 notes_system = NoteDatabaseSystem()
 
-def get_session_id(username: str) -> Optional[str]:
-    for sid, uname in notes_system.active_sessions.items():
-        if uname == username:
-            return sid
-    return None
-
 def create_response(success: bool, data: any = None, message: str = ""):
     return {"success": success, "data": data, "message": message}
 
@@ -45,7 +47,7 @@ class UserRegister(BaseModel):
     @classmethod
     def vu(cls, v): 
         v = v.strip()
-        if not v or len(v) < 3 or len(v) > 50: 
+        if not 3 <= len(v) <= 50: 
             raise ValueError("Username must be 3-50 chars")
         return v
     @field_validator("password")
@@ -78,7 +80,7 @@ class NoteCreate(BaseModel):
     @classmethod
     def vt(cls, v):
         v = v.strip()
-        if not v or len(v) > 200: 
+        if not 1 <= len(v) <= 200: 
             raise ValueError("Title must be 1-200 chars")
         return v
     @field_validator("content")
@@ -90,6 +92,15 @@ class NoteCreate(BaseModel):
 
 class NoteUpdate(BaseModel):
     content: str
+    title: Optional[str] = None  # rename in the same update when set
+    @field_validator("title")
+    @classmethod
+    def vt(cls, v):
+        if v is None: return None
+        v = v.strip()
+        if not 1 <= len(v) <= 200:
+            raise ValueError("Title must be 1-200 chars")
+        return v
     @field_validator("content")
     @classmethod
     def vc(cls, v):
@@ -108,13 +119,13 @@ class TodoCreate(BaseModel):
     @classmethod
     def vt(cls, v):
         v = v.strip()
-        if not v or len(v) > 200: 
+        if not 1 <= len(v) <= 200: 
             raise ValueError("Title must be 1-200 chars")
         return v
     @field_validator("priority")
     @classmethod
     def vp(cls, v):
-        if v not in {"low", "normal", "high"}: 
+        if v not in VALID_PRIORITIES: 
             raise ValueError("Priority must be low, normal, or high")
         return v
     @field_validator("description")
@@ -127,7 +138,7 @@ class TagsAdd(BaseModel):
     @classmethod
     def vt(cls, v):
         if not v: raise ValueError("Tags list cannot be empty")
-        cleaned = [t.strip() for t in v if t.strip()]
+        cleaned = [s for s in (t.strip() for t in v) if s]
         if not cleaned: raise ValueError("No valid tags provided")
         return cleaned
 
@@ -157,31 +168,35 @@ class AssignNoteFolder(BaseModel):
         return v
 
 # ---------- auth helper ----------
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> Tuple[str, str]:
+    # returns (username, session_id) so handlers use the caller's own session directly
     session_id = credentials.credentials
     username = notes_system._get_username_from_session(session_id)
     if not username:
         raise HTTPException(status_code=401, detail="Invalid session")
-    return username
+    return username, session_id
 
 # ---------- basic endpoints ----------
 @app.get("/test")
 async def test_endpoint():
     return create_response(True, {"timestamp": datetime.now().isoformat(), "version": "1.0.0"}, "API is working!")
 
+# constant payloads are built once at import; handlers only hand them back
+_HEALTH_PAYLOAD = create_response(True, {"status": "healthy"}, "Notes & Todos API is running")
+
 @app.get("/health")
 async def health_check():
-    return create_response(True, {"status": "healthy"}, "Notes & Todos API is running")
+    return _HEALTH_PAYLOAD
 
 # ---------- auth ----------
 @app.post("/register")
 async def register_user(user: UserRegister):
-    result = json.loads(notes_system.register_user(user.username, user.password))
+    result = await notes_system.register_user_async(user.username, user.password)
     return create_response(result["success"], {"username": user.username} if result["success"] else None, result["message"])
 
 @app.post("/login")
 async def login_user(user: UserLogin):
-    result = json.loads(notes_system.login_user(user.username, user.password))
+    result = await notes_system.login_user_async(user.username, user.password)
     if not result["success"]:
         raise HTTPException(status_code=401, detail=result["message"])
     return create_response(True, {"session_id": result["session_id"], "username": user.username}, result["message"])
@@ -189,178 +204,182 @@ async def login_user(user: UserLogin):
 @app.post("/logout")
 async def logout_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     session_id = credentials.credentials
-    result = json.loads(notes_system.logout_user(session_id))
+    result = notes_system.logout_user(session_id)
     return create_response(result["success"], None, result["message"])
 
 # ---------- notes ----------
+# handlers that touch SQLite are plain defs: FastAPI runs them on its threadpool,
+# so a query or commit never blocks the event loop; the connection pool makes that thread-safe
 @app.get("/notes")
-async def list_notes(limit: int = 50, username: str = Depends(get_current_user)):
-    sid = get_session_id(username)
-    if not sid: raise HTTPException(status_code=401, detail="Session not found")
-    result = json.loads(notes_system.list_notes(sid, limit))
+def list_notes(limit: int = 50, cursor: Optional[str] = None, auth: Tuple[str, str] = Depends(get_current_user)):
+    _, sid = auth
+    result = notes_system.list_notes(sid, limit, cursor)
     if not result["success"]: raise HTTPException(status_code=400, detail=result["message"])
-    return create_response(True, {"notes": result["notes"], "count": result["count"]}, f"Found {result['count']} notes")
+    return create_response(True, {"notes": result["notes"], "count": result["count"], "next_cursor": result["next_cursor"]},
+                           f"Found {result['count']} notes")
 
 @app.post("/notes")
-async def create_note(note: NoteCreate, username: str = Depends(get_current_user)):
-    sid = get_session_id(username)
-    if not sid: raise HTTPException(status_code=401, detail="Session not found")
-    result = json.loads(notes_system.create_note(sid, note.title, note.content, note.folder_id))
+def create_note(note: NoteCreate, auth: Tuple[str, str] = Depends(get_current_user)):
+    _, sid = auth
+    result = notes_system.create_note(sid, note.title, note.content, note.folder_id)
     if not result["success"]: raise HTTPException(status_code=400, detail=result["message"])
     return create_response(True, {"note_id": result.get("note_id"), "title": note.title}, result["message"])
 
 @app.get("/notes/{title}")
-async def get_note(title: str, username: str = Depends(get_current_user)):
-    sid = get_session_id(username)
-    if not sid: raise HTTPException(status_code=401, detail="Session not found")
-    result = json.loads(notes_system.get_note(sid, title))
+def get_note(title: str, auth: Tuple[str, str] = Depends(get_current_user)):
+    _, sid = auth
+    result = notes_system.get_note(sid, title)
     if not result["success"]: raise HTTPException(status_code=404, detail=result["message"])
     return create_response(True, {"note": result["note"]}, "Note retrieved successfully")
 
 @app.put("/notes/{title}")
-async def update_note(title: str, note_update: NoteUpdate, username: str = Depends(get_current_user)):
-    sid = get_session_id(username)
-    if not sid: raise HTTPException(status_code=401, detail="Session not found")
-    result = json.loads(notes_system.edit_note(sid, title, note_update.content))
+def update_note(title: str, note_update: NoteUpdate, auth: Tuple[str, str] = Depends(get_current_user)):
+    _, sid = auth
+    result = notes_system.edit_note(sid, title, note_update.content, note_update.title)
     if not result["success"]: raise HTTPException(status_code=400, detail=result["message"])
-    return create_response(True, {"title": title}, result["message"])
+    return create_response(True, {"title": note_update.title or title}, result["message"])
 
 @app.delete("/notes/{title}")
-async def delete_note(title: str, username: str = Depends(get_current_user)):
-    sid = get_session_id(username)
-    if not sid: raise HTTPException(status_code=401, detail="Session not found")
-    result = json.loads(notes_system.delete_note(sid, title))
+def delete_note(title: str, auth: Tuple[str, str] = Depends(get_current_user)):
+    _, sid = auth
+    result = notes_system.delete_note(sid, title)
     if not result["success"]: raise HTTPException(status_code=400, detail=result["message"])
     return create_response(True, {"deleted_title": title}, result["message"])
 
 @app.get("/notes/search/{query}")
-async def search_notes(query: str, username: str = Depends(get_current_user)):
+def search_notes(query: str, limit: int = 50, offset: int = 0, auth: Tuple[str, str] = Depends(get_current_user)):
+    return _search_notes(auth, query, limit, offset)
+
+# outside /notes/ so it can never shadow GET /notes/{title} for a note titled "search"
+@app.get("/search/notes")
+def search_notes_by_param(query: str, limit: int = 50, offset: int = 0,
+                          auth: Tuple[str, str] = Depends(get_current_user)):
+    return _search_notes(auth, query, limit, offset)
+
+def _search_notes(auth: Tuple[str, str], query: str, limit: int, offset: int):
     if not query.strip(): raise HTTPException(status_code=400, detail="Search query cannot be empty")
-    sid = get_session_id(username)
-    if not sid: raise HTTPException(status_code=401, detail="Session not found")
-    result = json.loads(notes_system.search_notes(sid, query))
+    _, sid = auth
+    result = notes_system.search_notes(sid, query, limit, offset)
     if not result["success"]: raise HTTPException(status_code=400, detail=result["message"])
     return create_response(True, {"results": result["results"], "count": result["count"], "query": query}, f"Found {result['count']} results")
 
 @app.post("/notes/{title}/tags")
-async def add_tags_to_note(title: str, tags: TagsAdd, username: str = Depends(get_current_user)):
-    sid = get_session_id(username)
-    if not sid: raise HTTPException(status_code=401, detail="Session not found")
-    result = json.loads(notes_system.add_tags(sid, title, tags.tags))
+def add_tags_to_note(title: str, tags: TagsAdd, auth: Tuple[str, str] = Depends(get_current_user)):
+    _, sid = auth
+    result = notes_system.add_tags(sid, title, tags.tags)
     if not result["success"]: raise HTTPException(status_code=400, detail=result["message"])
     return create_response(True, {"title": title, "all_tags": result["tags"]}, f"Tags added to '{title}'")
 
 # move note into/out of folder
 @app.post("/folders/assign-note")
-async def assign_note_folder(payload: AssignNoteFolder, username: str = Depends(get_current_user)):
-    sid = get_session_id(username)
-    if not sid: raise HTTPException(status_code=401, detail="Session not found")
-    result = json.loads(notes_system.set_note_folder(sid, payload.title, payload.folder_id))
+def assign_note_folder(payload: AssignNoteFolder, auth: Tuple[str, str] = Depends(get_current_user)):
+    _, sid = auth
+    result = notes_system.set_note_folder(sid, payload.title, payload.folder_id)
     if not result["success"]: raise HTTPException(status_code=400, detail=result["message"])
     return create_response(True, None, result["message"])
 
 # ---------- todos ----------
 @app.get("/todos")
-async def get_todos(status: Optional[str] = None, tag: Optional[str] = None,
-                    priority: Optional[str] = None, username: str = Depends(get_current_user)):
-    sid = get_session_id(username)
-    if not sid: raise HTTPException(status_code=401, detail="Session not found")
-    result = json.loads(notes_system.list_todos(sid, status, tag, priority))
+def get_todos(status: Optional[str] = None, tag: Optional[str] = None,
+              priority: Optional[str] = None, auth: Tuple[str, str] = Depends(get_current_user)):
+    _, sid = auth
+    result = notes_system.list_todos(sid, status, tag, priority)
     if not result["success"]: raise HTTPException(status_code=400, detail=result["message"])
     todos = result["results"]
     return create_response(True, {"todos": todos, "count": len(todos), "filters": {"status": status, "tag": tag, "priority": priority}}, f"Found {len(todos)} todos")
 
 @app.post("/todos")
-async def create_new_todo(todo: TodoCreate, username: str = Depends(get_current_user)):
-    sid = get_session_id(username)
-    if not sid: raise HTTPException(status_code=401, detail="Session not found")
-    result = json.loads(notes_system.create_todo(sid, todo.title, todo.description, todo.due_date, todo.priority, todo.tags, todo.note_title))
+def create_new_todo(todo: TodoCreate, auth: Tuple[str, str] = Depends(get_current_user)):
+    _, sid = auth
+    result = notes_system.create_todo(sid, todo.title, todo.description, todo.due_date, todo.priority, todo.tags, todo.note_title)
     if not result["success"]: raise HTTPException(status_code=400, detail=result["message"])
     return create_response(True, {"todo_id": result.get("id"), "title": todo.title}, result["message"])
 
 @app.patch("/todos/{todo_id}/toggle")
-async def toggle_todo_completion(todo_id: int, username: str = Depends(get_current_user)):
-    sid = get_session_id(username)
-    if not sid: raise HTTPException(status_code=401, detail="Session not found")
-    result = json.loads(notes_system.toggle_todo(sid, todo_id))
+def toggle_todo_completion(todo_id: int, auth: Tuple[str, str] = Depends(get_current_user)):
+    _, sid = auth
+    result = notes_system.toggle_todo(sid, todo_id)
     if not result["success"]: raise HTTPException(status_code=404, detail=result["message"])
     return create_response(True, {"todo_id": todo_id}, result["message"])
 
+@app.post("/todos/{todo_id}/tags")
+def add_tags_to_todo(todo_id: int, tags: TagsAdd, auth: Tuple[str, str] = Depends(get_current_user)):
+    _, sid = auth
+    result = notes_system.add_todo_tags(sid, todo_id, tags.tags)
+    if not result["success"]: raise HTTPException(status_code=400, detail=result["message"])
+    return create_response(True, {"todo_id": todo_id, "all_tags": result["tags"]}, "Tags added to todo")
+
 @app.delete("/todos/{todo_id}")
-async def delete_todo_item(todo_id: int, username: str = Depends(get_current_user)):
-    sid = get_session_id(username)
-    if not sid: raise HTTPException(status_code=401, detail="Session not found")
-    result = json.loads(notes_system.delete_todo(sid, todo_id))
+def delete_todo_item(todo_id: int, auth: Tuple[str, str] = Depends(get_current_user)):
+    _, sid = auth
+    result = notes_system.delete_todo(sid, todo_id)
     if not result["success"]: raise HTTPException(status_code=404, detail=result["message"])
     return create_response(True, {"deleted_todo_id": todo_id}, result["message"])
 
 # ---------- folders ----------
 @app.get("/folders")
-async def list_folders(username: str = Depends(get_current_user)):
-    sid = get_session_id(username)
-    if not sid: raise HTTPException(status_code=401, detail="Session not found")
-    result = json.loads(notes_system.list_folders(sid))
+def list_folders(auth: Tuple[str, str] = Depends(get_current_user)):
+    _, sid = auth
+    result = notes_system.list_folders(sid)
     if not result["success"]: raise HTTPException(status_code=400, detail=result["message"])
     return create_response(True, result["folders"], "Folders fetched")
 
 @app.post("/folders")
-async def create_folder(folder: FolderCreate, username: str = Depends(get_current_user)):
-    sid = get_session_id(username)
-    if not sid: raise HTTPException(status_code=401, detail="Session not found")
-    result = json.loads(notes_system.create_folder(sid, folder.name, folder.parent_id))
+def create_folder(folder: FolderCreate, auth: Tuple[str, str] = Depends(get_current_user)):
+    _, sid = auth
+    result = notes_system.create_folder(sid, folder.name, folder.parent_id)
     if not result["success"]: raise HTTPException(status_code=400, detail=result["message"])
     return create_response(True, {"id": result["id"]}, result["message"])
 
 @app.patch("/folders/{folder_id}")
-async def update_folder(folder_id: int, upd: FolderUpdate, username: str = Depends(get_current_user)):
-    sid = get_session_id(username)
-    if not sid: raise HTTPException(status_code=401, detail="Session not found")
+def update_folder(folder_id: int, upd: FolderUpdate, auth: Tuple[str, str] = Depends(get_current_user)):
+    _, sid = auth
     if upd.name is not None:
-        res = json.loads(notes_system.rename_folder(sid, folder_id, upd.name))
+        res = notes_system.rename_folder(sid, folder_id, upd.name)
         if not res["success"]: raise HTTPException(status_code=404, detail=res["message"])
     if upd.parent_id is not None:
-        res2 = json.loads(notes_system.move_folder(sid, folder_id, upd.parent_id))
+        res2 = notes_system.move_folder(sid, folder_id, upd.parent_id)
         if not res2["success"]: raise HTTPException(status_code=400, detail=res2["message"])
     return create_response(True, {"id": folder_id}, "Folder updated")
 
 @app.delete("/folders/{folder_id}")
-async def remove_folder(folder_id: int, username: str = Depends(get_current_user)):
-    sid = get_session_id(username)
-    if not sid: raise HTTPException(status_code=401, detail="Session not found")
-    result = json.loads(notes_system.delete_folder(sid, folder_id))
+def remove_folder(folder_id: int, auth: Tuple[str, str] = Depends(get_current_user)):
+    _, sid = auth
+    result = notes_system.delete_folder(sid, folder_id)
     if not result["success"]: raise HTTPException(status_code=404, detail=result["message"])
     return create_response(True, {"deleted_folder_id": folder_id}, result["message"])
 
 # ---------- stats ----------
 @app.get("/stats")
-async def get_user_stats(username: str = Depends(get_current_user)):
-    sid = get_session_id(username)
-    if not sid: raise HTTPException(status_code=401, detail="Session not found")
-    result = json.loads(notes_system.get_stats(sid))
+def get_user_stats(auth: Tuple[str, str] = Depends(get_current_user)):
+    _, sid = auth
+    result = notes_system.get_stats(sid)
     if not result["success"]: raise HTTPException(status_code=400, detail=result["message"])
     return create_response(True, result["data"], "Statistics retrieved successfully")
 
 # ---------- root redirect ----------
+_ROOT_PAYLOAD = create_response(
+    True,
+    {
+        "version": "1.0.0",
+        "endpoints": {
+            "auth": ["/register", "/login", "/logout"],
+            "notes": ["/notes", "/notes/{title}", "/notes/search/{query}", "/search/notes"],
+            "todos": ["/todos", "/todos/{todo_id}", "/todos/{todo_id}/tags"],
+            "folders": ["/folders", "/folders/{id}", "/folders/assign-note"],
+            "other": ["/stats", "/health", "/test"],
+        },
+        "docs": "/docs",
+    },
+    "Welcome to Notes & Todos API",
+)
+
 @app.get("/")
 async def root():
     index = os.path.join(FRONTEND_DIR, "loading.html")
     if os.path.exists(index):
         return RedirectResponse(url="/frontend/loading.html")
-    return create_response(
-        True,
-        {
-            "version": "1.0.0",
-            "endpoints": {
-                "auth": ["/register", "/login", "/logout"],
-                "notes": ["/notes", "/notes/{title}", "/notes/search/{query}"],
-                "todos": ["/todos", "/todos/{todo_id}"],
-                "folders": ["/folders", "/folders/{id}", "/folders/assign-note"],
-                "other": ["/stats", "/health", "/test"],
-            },
-            "docs": "/docs",
-        },
-        "Welcome to Notes & Todos API",
-    )
+    return _ROOT_PAYLOAD
 
 if __name__ == "__main__":
     import uvicorn
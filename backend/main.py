@@ -1,231 +1,295 @@
 # backend/main.py
-import json
-import uuid
-from typing import Optional, List, Dict
+import asyncio
+import secrets
+import threading
+from collections import OrderedDict
+from typing import Optional, List, Dict, Any, Tuple, Callable
 from .database import NoteDatabase
 
+MAX_SESSIONS = 50_000  # least recently used sessions are dropped beyond this
+VALID_PRIORITIES = frozenset(("low", "normal", "high"))
+MAX_PAGE_SIZE = 200  # upper bound on notes returned per page
+
+
+def _parse_cursor(cursor: str) -> Optional[Tuple[str, int]]:
+    # cursors are "<id>:<modified_at>" as handed out in next_cursor
+    note_id, _, modified_at = cursor.partition(":")
+    if not note_id.isdigit() or not modified_at:
+        return None
+    return modified_at, int(note_id)
+
+
+def _clean_tags(tags: Optional[List[str]]) -> List[str]:
+    # one strip per tag; blanks dropped
+    return [s for s in (t.strip() for t in tags or ()) if s]
+
 
 class NoteDatabaseSystem:
+    __slots__ = ("db", "active_sessions", "_sessions_lock")
+
     def __init__(self, db_path: str = "notes.db"):
         self.db = NoteDatabase(db_path)
-        self.active_sessions: Dict[str, str] = {}  # session_id -> username
+        # session_id -> (username, user_id); the id is resolved once at login, not per request
+        self.active_sessions: "OrderedDict[str, Tuple[str, int]]" = OrderedDict()
+        self._sessions_lock = threading.Lock()
 
     # -------- auth --------
-    def register_user(self, username: str, password: str) -> str:
-        if not username.strip() or not password:
-            return json.dumps({"success": False, "message": "Username and password are required"})
-        if self.db.create_user(username.strip(), password):
-            return json.dumps({"success": True, "message": "User registered successfully"})
-        return json.dumps({"success": False, "message": "Username already exists"})
-
-    def login_user(self, username: str, password: str) -> str:
-        if not username.strip() or not password:
-            return json.dumps({"success": False, "message": "Username and password are required"})
-        if self.db.verify_user(username.strip(), password):
-            sid = str(uuid.uuid4())
-            self.active_sessions[sid] = username.strip()
-            return json.dumps({"success": True, "message": "Login successful", "session_id": sid})
-        return json.dumps({"success": False, "message": "Invalid username or password"})
-
-    def logout_user(self, session_id: str) -> str:
-        if session_id in self.active_sessions:
-            del self.active_sessions[session_id]
-            return json.dumps({"success": True, "message": "Logout successful"})
-        return json.dumps({"success": False, "message": "Invalid session"})
+    def register_user(self, username: str, password: str) -> Dict[str, Any]:
+        username = username.strip()
+        if not username or not password:
+            return {"success": False, "message": "Username and password are required"}
+        if self.db.create_user(username, password):
+            return {"success": True, "message": "User registered successfully"}
+        return {"success": False, "message": "Username already exists"}
+
+    def login_user(self, username: str, password: str) -> Dict[str, Any]:
+        username = username.strip()
+        if not username or not password:
+            return {"success": False, "message": "Username and password are required"}
+        if self.db.verify_user(username, password):
+            sid = self._open_session(username)
+            return {"success": True, "message": "Login successful", "session_id": sid}
+        return {"success": False, "message": "Invalid username or password"}
+
+    # async variants keep bcrypt and every SQLite step off the event loop
+    async def register_user_async(self, username: str, password: str) -> Dict[str, Any]:
+        username = username.strip()
+        if not username or not password:
+            return {"success": False, "message": "Username and password are required"}
+        if await self.db.create_user_async(username, password):
+            return {"success": True, "message": "User registered successfully"}
+        return {"success": False, "message": "Username already exists"}
+
+    async def login_user_async(self, username: str, password: str) -> Dict[str, Any]:
+        username = username.strip()
+        if not username or not password:
+            return {"success": False, "message": "Username and password are required"}
+        if await self.db.verify_user_async(username, password):
+            sid = await asyncio.to_thread(self._open_session, username)  # may look the user id up in SQL
+            return {"success": True, "message": "Login successful", "session_id": sid}
+        return {"success": False, "message": "Invalid username or password"}
+
+    def _open_session(self, username: str) -> str:
+        sid = secrets.token_urlsafe(18)
+        entry = (username, self.db.get_user_id(username))
+        with self._sessions_lock:
+            self.active_sessions[sid] = entry
+            if len(self.active_sessions) > MAX_SESSIONS:
+                self.active_sessions.popitem(last=False)
+        return sid
+
+    def logout_user(self, session_id: str) -> Dict[str, Any]:
+        with self._sessions_lock:
+            removed = self.active_sessions.pop(session_id, None)
+        if removed:
+            return {"success": True, "message": "Logout successful"}
+        return {"success": False, "message": "Invalid session"}
+
+    def _session(self, session_id: str) -> Optional[Tuple[str, int]]:
+        with self._sessions_lock:
+            s = self.active_sessions.get(session_id)
+            if s:
+                self.active_sessions.move_to_end(session_id)
+        return s
 
     def _get_username_from_session(self, session_id: str) -> Optional[str]:
-        return self.active_sessions.get(session_id)
+        s = self._session(session_id)
+        return s[0] if s else None
 
     def _uid(self, session_id: str) -> Optional[int]:
-        uname = self._get_username_from_session(session_id)
-        if not uname:
-            return None
-        return self.db.get_user_id(uname)
+        s = self._session(session_id)
+        return s[1] if s else None
+
+    def _user_op(self, session_id: str, op: Callable[[int], bool], ok_msg: str, fail_msg: str,
+                 invalid: Optional[str] = None) -> Dict[str, Any]:
+        # shared shape of the yes/no operations: session check, input check, one db call
+        uid = self._uid(session_id)
+        if not uid:
+            return {"success": False, "message": "Not logged in"}
+        if invalid:
+            return {"success": False, "message": invalid}
+        ok = op(uid)
+        return {"success": ok, "message": ok_msg if ok else fail_msg}
 
     # -------- notes --------
-    def create_note(self, session_id: str, title: str, content: str, folder_id: Optional[int] = None) -> str:
+    def create_note(self, session_id: str, title: str, content: str, folder_id: Optional[int] = None) -> Dict[str, Any]:
         uid = self._uid(session_id)
         if not uid:
-            return json.dumps({"success": False, "message": "Not logged in"})
-        if not title.strip() or not content.strip():
-            return json.dumps({"success": False, "message": "Title and content are required"})
-        note_id = self.db.create_note(uid, title.strip(), content.strip(), folder_id)
+            return {"success": False, "message": "Not logged in"}
+        title, content = title.strip(), content.strip()
+        if not title or not content:
+            return {"success": False, "message": "Title and content are required"}
+        note_id = self.db.create_note(uid, title, content, folder_id)
         if note_id:
-            return json.dumps({"success": True, "message": "Note created successfully", "note_id": note_id})
-        return json.dumps({"success": False, "message": "Note title already exists"})
+            return {"success": True, "message": "Note created successfully", "note_id": note_id}
+        return {"success": False, "message": "Note title already exists"}
 
-    def get_note(self, session_id: str, title: str) -> str:
+    def get_note(self, session_id: str, title: str) -> Dict[str, Any]:
         uid = self._uid(session_id)
         if not uid:
-            return json.dumps({"success": False, "message": "Not logged in"})
-        if not title.strip():
-            return json.dumps({"success": False, "message": "Title is required"})
-        note = self.db.get_note_by_title(uid, title.strip())
+            return {"success": False, "message": "Not logged in"}
+        title = title.strip()
+        if not title:
+            return {"success": False, "message": "Title is required"}
+        note = self.db.get_note_by_title(uid, title)
         if note:
-            return json.dumps({"success": True, "note": note})
-        return json.dumps({"success": False, "message": "Note not found"})
+            return {"success": True, "note": note}
+        return {"success": False, "message": "Note not found"}
 
-    def list_notes(self, session_id: str, limit: int = 50) -> str:
-        uid = self._uid(session_id)
-        if not uid:
-            return json.dumps({"success": False, "message": "Not logged in"})
-        notes = self.db.get_user_notes(uid, limit)
-        for n in notes:
-            n["preview"] = n["content"][:100] + ("..." if len(n["content"]) > 100 else "")
-            del n["content"]
-        return json.dumps({"success": True, "notes": notes, "count": len(notes)})
-
-    def edit_note(self, session_id: str, title: str, new_content: str) -> str:
+    def list_notes(self, session_id: str, limit: int = 50, cursor: Optional[str] = None) -> Dict[str, Any]:
         uid = self._uid(session_id)
         if not uid:
-            return json.dumps({"success": False, "message": "Not logged in"})
-        if not title.strip() or not new_content.strip():
-            return json.dumps({"success": False, "message": "Title and content are required"})
-        ok = self.db.update_note_content(uid, title.strip(), new_content.strip())
-        return json.dumps({"success": ok, "message": "Note updated successfully" if ok else "Note not found"})
+            return {"success": False, "message": "Not logged in"}
+        before = None
+        if cursor:
+            before = _parse_cursor(cursor)
+            if before is None:
+                return {"success": False, "message": "Invalid cursor"}
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        notes = self.db.get_user_notes_list(uid, limit, before)
+        # a full page may have more behind it; keyset cursors stay O(limit) however deep the page
+        next_cursor = f"{notes[-1]['id']}:{notes[-1]['modified_at']}" if len(notes) == limit else None
+        return {"success": True, "notes": notes, "count": len(notes), "next_cursor": next_cursor}
 
-    def delete_note(self, session_id: str, title: str) -> str:
+    def edit_note(self, session_id: str, title: str, new_content: str, new_title: Optional[str] = None) -> Dict[str, Any]:
         uid = self._uid(session_id)
         if not uid:
-            return json.dumps({"success": False, "message": "Not logged in"})
-        if not title.strip():
-            return json.dumps({"success": False, "message": "Title is required"})
-        ok = self.db.delete_note(uid, title.strip())
-        return json.dumps({"success": ok, "message": "Note deleted successfully" if ok else "Note not found"})
+            return {"success": False, "message": "Not logged in"}
+        title, new_content = title.strip(), new_content.strip()
+        if not title or not new_content:
+            return {"success": False, "message": "Title and content are required"}
+        if new_title is not None:
+            new_title = new_title.strip()
+            if not new_title:  # a rename must not leave the note with a blank title
+                return {"success": False, "message": "Title is required"}
+        ok = self.db.update_note(uid, title, new_content, new_title)
+        if ok:
+            return {"success": True, "message": "Note updated successfully"}
+        return {"success": False, "message": "Note not found or title already exists" if new_title else "Note not found"}
+
+    def delete_note(self, session_id: str, title: str) -> Dict[str, Any]:
+        title = title.strip()
+        return self._user_op(session_id, lambda uid: self.db.delete_note(uid, title),
+                             "Note deleted successfully", "Note not found", None if title else "Title is required")
 
-    def search_notes(self, session_id: str, query: str) -> str:
+    def search_notes(self, session_id: str, query: str, limit: int = 50, offset: int = 0) -> Dict[str, Any]:
         uid = self._uid(session_id)
         if not uid:
-            return json.dumps({"success": False, "message": "Not logged in"})
-        if not query.strip():
-            return json.dumps({"success": False, "message": "Search query is required"})
-        results = self.db.search_user_notes(uid, query.strip())
-        for r in results:
-            r["preview"] = r["content"][:150] + ("..." if len(r["content"]) > 150 else "")
-            del r["content"]
-        return json.dumps({"success": True, "results": results, "count": len(results)})
-
-    def add_tags(self, session_id: str, title: str, tags: List[str]) -> str:
+            return {"success": False, "message": "Not logged in"}
+        query = query.strip()
+        if not query:
+            return {"success": False, "message": "Search query is required"}
+        limit, offset = max(1, min(limit, MAX_PAGE_SIZE)), max(0, offset)
+        results = self.db.search_user_notes(uid, query, limit, offset)
+        return {"success": True, "results": results, "count": len(results)}
+
+    def add_tags(self, session_id: str, title: str, tags: List[str]) -> Dict[str, Any]:
         uid = self._uid(session_id)
         if not uid:
-            return json.dumps({"success": False, "message": "Not logged in"})
-        if not title.strip():
-            return json.dumps({"success": False, "message": "Title is required"})
-        if not tags or not any(t.strip() for t in tags):
-            return json.dumps({"success": False, "message": "At least one valid tag is required"})
-        all_tags = self.db.add_note_tags(uid, title.strip(), [t.strip() for t in tags if t.strip()])
+            return {"success": False, "message": "Not logged in"}
+        title = title.strip()
+        if not title:
+            return {"success": False, "message": "Title is required"}
+        clean = _clean_tags(tags)
+        if not clean:
+            return {"success": False, "message": "At least one valid tag is required"}
+        all_tags = self.db.add_note_tags(uid, title, clean)
         if all_tags is None:
-            return json.dumps({"success": False, "message": "Note not found"})
-        return json.dumps({"success": True, "tags": all_tags})
+            return {"success": False, "message": "Note not found"}
+        return {"success": True, "tags": all_tags}
 
-    def set_note_folder(self, session_id: str, title: str, folder_id: Optional[int]) -> str:
-        uid = self._uid(session_id)
-        if not uid:
-            return json.dumps({"success": False, "message": "Not logged in"})
-        ok = self.db.set_note_folder(uid, title.strip(), folder_id)
-        return json.dumps({"success": ok, "message": "Note moved" if ok else "Note not found"})
+    def set_note_folder(self, session_id: str, title: str, folder_id: Optional[int]) -> Dict[str, Any]:
+        return self._user_op(session_id, lambda uid: self.db.set_note_folder(uid, title.strip(), folder_id),
+                             "Note moved", "Note not found")
 
     # -------- todos --------
     def create_todo(self, session_id: str, title: str, description: str = "",
                     due_date: str = None, priority: str = "normal",
-                    tags: List[str] = None, note_title: str = None) -> str:
+                    tags: List[str] = None, note_title: str = None) -> Dict[str, Any]:
         uid = self._uid(session_id)
         if not uid:
-            return json.dumps({"success": False, "message": "Not logged in"})
-        if not title.strip():
-            return json.dumps({"success": False, "message": "Title is required"})
-        if priority not in {"low", "normal", "high"}:
+            return {"success": False, "message": "Not logged in"}
+        title = title.strip()
+        if not title:
+            return {"success": False, "message": "Title is required"}
+        if priority not in VALID_PRIORITIES:
             priority = "normal"
-        todo_id = self.db.create_todo(uid, title.strip(), description.strip() if description else "",
-                                      due_date, priority, note_title.strip() if note_title else None)
-        if todo_id and tags:
-            clean = [t.strip() for t in tags if t.strip()]
-            if clean:
-                self.db.add_todo_tags(uid, todo_id, clean)
-        return json.dumps({"success": True, "id": todo_id, "message": "Todo created"})
+        clean = _clean_tags(tags)
+        todo_id = self.db.create_todo(uid, title, description.strip() if description else "",
+                                      due_date, priority, note_title.strip() if note_title else None, clean)
+        return {"success": True, "id": todo_id, "message": "Todo created"}
 
     def list_todos(self, session_id: str, status: str = None, tag: str = None,
-                   priority: str = None, linked_to_note: str = None) -> str:
-        uid = self._uid(session_id)
-        if not uid:
-            return json.dumps({"success": False, "message": "Not logged in"})
-        todos = self.db.get_user_todos(uid, status, tag, priority, linked_to_note)
-        results = [{
-            "id": t["id"],
-            "title": t["title"],
-            "due_date": t["due_date"],
-            "priority": t["priority"],
-            "completed": t["completed"],
-            "tags": t["tags"],
-            "note_title": t["note_title"],
-        } for t in todos]
-        return json.dumps({"success": True, "results": results})
-
-    def toggle_todo(self, session_id: str, todo_id: int) -> str:
+                   priority: str = None, linked_to_note: str = None) -> Dict[str, Any]:
         uid = self._uid(session_id)
         if not uid:
-            return json.dumps({"success": False, "message": "Not logged in"})
-        ok = self.db.toggle_todo(uid, todo_id)
-        return json.dumps({"success": ok, "message": "Todo updated" if ok else "Todo not found"})
+            return {"success": False, "message": "Not logged in"}
+        results = self.db.get_user_todos_list(uid, status, tag, priority, linked_to_note)
+        return {"success": True, "results": results}
+
+    def toggle_todo(self, session_id: str, todo_id: int) -> Dict[str, Any]:
+        return self._user_op(session_id, lambda uid: self.db.toggle_todo(uid, todo_id),
+                             "Todo updated", "Todo not found")
 
-    def delete_todo(self, session_id: str, todo_id: int) -> str:
+    def add_todo_tags(self, session_id: str, todo_id: int, tags: List[str]) -> Dict[str, Any]:
         uid = self._uid(session_id)
         if not uid:
-            return json.dumps({"success": False, "message": "Not logged in"})
-        ok = self.db.delete_todo(uid, todo_id)
-        return json.dumps({"success": ok, "message": "Todo deleted" if ok else "Todo not found"})
+            return {"success": False, "message": "Not logged in"}
+        clean = _clean_tags(tags)
+        if not clean:
+            return {"success": False, "message": "At least one valid tag is required"}
+        all_tags = self.db.add_todo_tags(uid, todo_id, clean)
+        if all_tags is None:
+            return {"success": False, "message": "Todo not found"}
+        return {"success": True, "tags": all_tags}
+
+    def delete_todo(self, session_id: str, todo_id: int) -> Dict[str, Any]:
+        return self._user_op(session_id, lambda uid: self.db.delete_todo(uid, todo_id),
+                             "Todo deleted", "Todo not found")
 
     # -------- folders --------
-    def create_folder(self, session_id: str, name: str, parent_id: Optional[int]) -> str:
+    def create_folder(self, session_id: str, name: str, parent_id: Optional[int]) -> Dict[str, Any]:
         uid = self._uid(session_id)
         if not uid:
-            return json.dumps({"success": False, "message": "Not logged in"})
-        if not name.strip():
-            return json.dumps({"success": False, "message": "Folder name is required"})
-        fid = self.db.create_folder(uid, name.strip(), parent_id)
-        return json.dumps({"success": True, "id": fid, "message": "Folder created"})
+            return {"success": False, "message": "Not logged in"}
+        name = name.strip()
+        if not name:
+            return {"success": False, "message": "Folder name is required"}
+        fid = self.db.create_folder(uid, name, parent_id)
+        return {"success": True, "id": fid, "message": "Folder created"}
 
-    def list_folders(self, session_id: str) -> str:
+    def list_folders(self, session_id: str) -> Dict[str, Any]:
         uid = self._uid(session_id)
         if not uid:
-            return json.dumps({"success": False, "message": "Not logged in"})
+            return {"success": False, "message": "Not logged in"}
         tree = self.db.list_folders_tree(uid)
-        return json.dumps({"success": True, "folders": tree})
+        return {"success": True, "folders": tree}
 
-    def rename_folder(self, session_id: str, folder_id: int, new_name: str) -> str:
-        uid = self._uid(session_id)
-        if not uid:
-            return json.dumps({"success": False, "message": "Not logged in"})
-        if not new_name.strip():
-            return json.dumps({"success": False, "message": "Folder name is required"})
-        ok = self.db.rename_folder(uid, folder_id, new_name.strip())
-        return json.dumps({"success": ok, "message": "Folder renamed" if ok else "Folder not found"})
+    def rename_folder(self, session_id: str, folder_id: int, new_name: str) -> Dict[str, Any]:
+        new_name = new_name.strip()
+        return self._user_op(session_id, lambda uid: self.db.rename_folder(uid, folder_id, new_name),
+                             "Folder renamed", "Folder not found", None if new_name else "Folder name is required")
 
-    def move_folder(self, session_id: str, folder_id: int, new_parent_id: Optional[int]) -> str:
-        uid = self._uid(session_id)
-        if not uid:
-            return json.dumps({"success": False, "message": "Not logged in"})
-        ok = self.db.move_folder(uid, folder_id, new_parent_id)
-        return json.dumps({"success": ok, "message": "Folder moved" if ok else "Move failed"})
+    def move_folder(self, session_id: str, folder_id: int, new_parent_id: Optional[int]) -> Dict[str, Any]:
+        return self._user_op(session_id, lambda uid: self.db.move_folder(uid, folder_id, new_parent_id),
+                             "Folder moved", "Move failed")
 
-    def delete_folder(self, session_id: str, folder_id: int) -> str:
-        uid = self._uid(session_id)
-        if not uid:
-            return json.dumps({"success": False, "message": "Not logged in"})
-        ok = self.db.delete_folder(uid, folder_id)
-        return json.dumps({"success": ok, "message": "Folder deleted" if ok else "Folder not found"})
+    def delete_folder(self, session_id: str, folder_id: int) -> Dict[str, Any]:
+        return self._user_op(session_id, lambda uid: self.db.delete_folder(uid, folder_id),
+                             "Folder deleted", "Folder not found")
 
     # -------- stats --------
-    def get_stats(self, session_id: str) -> str:
+    def get_stats(self, session_id: str) -> Dict[str, Any]:
         uid = self._uid(session_id)
         if not uid:
-            return json.dumps({"success": False, "message": "Not logged in"})
+            return {"success": False, "message": "Not logged in"}
         stats = self.db.get_user_stats(uid)
         data = {
             "notes": stats["total_notes"],
             "todos": stats["total_todos"],
             "folders": stats["total_folders"],
             "tags": stats["total_tags"],
+            "reminders": stats["total_reminders"],
             "recent_note": stats["recent_note"],
         }
-        return json.dumps({"success": True, "data": data})
+        return {"success": True, "data": data}
@@ -0,0 +1,70 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from backend.database import NoteDatabase
+
+
+class VerifiedLoginCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = NoteDatabase(os.path.join(self.tmp.name, "notes.db"), bcrypt_rounds=4)
+        self.db.create_user("alice", "secret123")
+
+    def tearDown(self):
+        self.db.close()
+        self.tmp.cleanup()
+
+    def bcrypt_checks(self):
+        return mock.patch.object(self.db, "_verify_password", wraps=self.db._verify_password)
+
+    def test_repeat_login_skips_bcrypt(self):
+        self.assertTrue(self.db.verify_user("alice", "secret123"))
+        with self.bcrypt_checks() as check:
+            self.assertTrue(self.db.verify_user("alice", "secret123"))
+        check.assert_not_called()
+
+    def test_wrong_password_still_goes_through_bcrypt(self):
+        self.assertTrue(self.db.verify_user("alice", "secret123"))
+        with self.bcrypt_checks() as check:
+            self.assertFalse(self.db.verify_user("alice", "wrong-password"))
+        check.assert_called_once()
+
+    def test_changed_hash_drops_the_cached_login(self):
+        self.assertTrue(self.db.verify_user("alice", "secret123"))
+        self.assertTrue(self.db._set_password_hash("alice", self.db._hash_password("new-secret")))
+        self.assertFalse(self.db.verify_user("alice", "secret123"))
+        self.assertTrue(self.db.verify_user("alice", "new-secret"))
+
+
+class RehashOnLoginTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "notes.db")
+        legacy = NoteDatabase(self.path, bcrypt_rounds=5)
+        legacy.create_user("alice", "secret123")
+        legacy.close()
+        self.db = NoteDatabase(self.path, bcrypt_rounds=4)
+
+    def tearDown(self):
+        self.db.close()
+        self.tmp.cleanup()
+
+    def test_dummy_hash_uses_the_configured_cost(self):
+        self.assertTrue(self.db._dummy_hash.startswith(b"$2b$04$"))
+
+    def test_login_rewrites_an_older_cost_hash(self):
+        self.assertTrue(self.db._get_password_hash("alice").startswith(b"$2b$05$"))
+        self.assertTrue(self.db.verify_user("alice", "secret123"))
+        self.assertTrue(self.db._get_password_hash("alice").startswith(b"$2b$04$"))
+        self.assertTrue(self.db.verify_user("alice", "secret123"))
+
+    def test_failed_login_keeps_the_stored_hash(self):
+        before = self.db._get_password_hash("alice")
+        self.assertFalse(self.db.verify_user("alice", "wrong-password"))
+        self.assertEqual(self.db._get_password_hash("alice"), before)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from backend.database import NoteDatabase
+
+# tag junction tables as they were created before WITHOUT ROWID
+_LEGACY_SCHEMA = """
+CREATE TABLE users (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  username TEXT UNIQUE NOT NULL,
+  password_hash BLOB NOT NULL,
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE notes (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  user_id INTEGER NOT NULL,
+  title TEXT NOT NULL,
+  content TEXT NOT NULL,
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  modified_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  reminder_date TEXT,
+  folder_id INTEGER,
+  FOREIGN KEY (user_id) REFERENCES users (id),
+  UNIQUE(user_id, title)
+);
+CREATE TABLE tags (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT UNIQUE NOT NULL);
+CREATE TABLE note_tags (
+  note_id INTEGER,
+  tag_id INTEGER,
+  PRIMARY KEY (note_id, tag_id),
+  FOREIGN KEY (note_id) REFERENCES notes(id) ON DELETE CASCADE,
+  FOREIGN KEY (tag_id) REFERENCES tags(id) ON DELETE CASCADE
+);
+CREATE TABLE todos (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  user_id INTEGER NOT NULL,
+  title TEXT NOT NULL,
+  description TEXT DEFAULT '',
+  due_date TEXT,
+  priority TEXT DEFAULT 'normal',
+  completed BOOLEAN DEFAULT FALSE,
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  note_id INTEGER,
+  FOREIGN KEY (user_id) REFERENCES users (id),
+  FOREIGN KEY (note_id) REFERENCES notes (id)
+);
+CREATE TABLE todo_tags (
+  todo_id INTEGER,
+  tag_id INTEGER,
+  PRIMARY KEY (todo_id, tag_id),
+  FOREIGN KEY (todo_id) REFERENCES todos(id) ON DELETE CASCADE,
+  FOREIGN KEY (tag_id) REFERENCES tags(id) ON DELETE CASCADE
+);
+INSERT INTO users (username, password_hash) VALUES ('alice', 'x');
+INSERT INTO notes (user_id, title, content) VALUES (1, 'plan', 'body');
+INSERT INTO tags (name) VALUES ('work'), ('home');
+INSERT INTO note_tags VALUES (1, 1), (1, 2);
+INSERT INTO todos (user_id, title) VALUES (1, 'call');
+INSERT INTO todo_tags VALUES (1, 2);
+"""
+
+
+class WithoutRowidMigrationTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "notes.db")
+        conn = sqlite3.connect(self.path)
+        conn.executescript(_LEGACY_SCHEMA)
+        conn.close()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def open(self):
+        db = NoteDatabase(self.path, bcrypt_rounds=4)
+        self.addCleanup(db.close)
+        return db
+
+    def table_sql(self):
+        conn = sqlite3.connect(self.path)
+        try:
+            return dict(conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'table'").fetchall())
+        finally:
+            conn.close()
+
+    def test_junction_tables_are_rebuilt_keeping_their_rows(self):
+        db = self.open()
+        tables = self.table_sql()
+        for name in ("note_tags", "todo_tags"):
+            with self.subTest(table=name):
+                self.assertIn("WITHOUT ROWID", tables[name].upper())
+                self.assertNotIn(f"{name}_rowid", tables)
+        self.assertEqual(sorted(db.get_note_by_title(1, "plan")["tags"]), ["home", "work"])
+        self.assertEqual(db.get_user_todos(1)[0]["tags"], ["home"])
+
+    def test_reopening_a_migrated_database_changes_nothing(self):
+        self.open().close()
+        before = self.table_sql()
+        db = self.open()
+        self.assertEqual(self.table_sql(), before)
+        self.assertEqual(sorted(db.get_note_by_title(1, "plan")["tags"]), ["home", "work"])
+
+
+if __name__ == "__main__":
+    unittest.main()
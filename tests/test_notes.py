@@ -0,0 +1,45 @@
+import os
+import tempfile
+import unittest
+
+from backend.main import NoteDatabaseSystem
+
+
+class EditNoteTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.system = NoteDatabaseSystem(os.path.join(self.tmp.name, "notes.db"))
+        self.system.register_user("alice", "secret123")
+        self.sid = self.system.login_user("alice", "secret123")["session_id"]
+        self.system.create_note(self.sid, "hello", "first content")
+
+    def tearDown(self):
+        self.system.db.close()
+        self.tmp.cleanup()
+
+    def test_blank_rename_is_rejected(self):
+        for new_title in ("", "   "):
+            with self.subTest(new_title=new_title):
+                result = self.system.edit_note(self.sid, "hello", "new content", new_title)
+                self.assertEqual(result, {"success": False, "message": "Title is required"})
+        note = self.system.get_note(self.sid, "hello")["note"]
+        self.assertEqual(note["content"], "first content")
+
+    def test_content_only_update_keeps_the_title(self):
+        self.assertTrue(self.system.edit_note(self.sid, "hello", "new content")["success"])
+        self.assertEqual(self.system.get_note(self.sid, "hello")["note"]["content"], "new content")
+
+    def test_rename_is_stripped_and_applied_with_the_content(self):
+        self.assertTrue(self.system.edit_note(self.sid, "hello", "new content", "  renamed  ")["success"])
+        self.assertFalse(self.system.get_note(self.sid, "hello")["success"])
+        self.assertEqual(self.system.get_note(self.sid, "renamed")["note"]["content"], "new content")
+
+    def test_rename_onto_an_existing_title_fails(self):
+        self.system.create_note(self.sid, "other", "other content")
+        result = self.system.edit_note(self.sid, "hello", "new content", "other")
+        self.assertEqual(result, {"success": False, "message": "Note not found or title already exists"})
+        self.assertEqual(self.system.get_note(self.sid, "hello")["note"]["content"], "first content")
+
+
+if __name__ == "__main__":
+    unittest.main()
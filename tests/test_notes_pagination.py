@@ -0,0 +1,71 @@
+import os
+import tempfile
+import unittest
+
+from backend.main import NoteDatabaseSystem
+
+
+class ListNotesCursorTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.system = NoteDatabaseSystem(os.path.join(self.tmp.name, "notes.db"))
+        self.system.register_user("alice", "secret123")
+        self.sid = self.system.login_user("alice", "secret123")["session_id"]
+        uid = self.system._uid(self.sid)
+        db = self.system.db
+        db.create_notes_bulk(uid, [(f"note {i}", f"body {i}", None) for i in range(1, 8)])
+        # two runs of notes sharing a modified_at second, so page boundaries fall inside a tie
+        with db._write() as conn:
+            conn.execute("UPDATE notes SET modified_at = '2024-01-02 10:00:00' WHERE title IN ('note 1', 'note 2', 'note 3')")
+            conn.execute("UPDATE notes SET modified_at = '2024-01-01 09:00:00' WHERE title IN ('note 4', 'note 5', 'note 6', 'note 7')")
+        db.add_note_tags(uid, "note 1", ["work", "urgent"])
+
+    def tearDown(self):
+        self.system.db.close()
+        self.tmp.cleanup()
+
+    def walk(self, limit):
+        pages, cursor = [], None
+        while True:
+            result = self.system.list_notes(self.sid, limit=limit, cursor=cursor)
+            self.assertTrue(result["success"])
+            pages.append([n["title"] for n in result["notes"]])
+            cursor = result["next_cursor"]
+            if cursor is None:
+                return pages
+
+    def test_pages_cover_every_note_once_in_order(self):
+        pages = self.walk(limit=2)
+        self.assertEqual(pages, [["note 3", "note 2"], ["note 1", "note 7"], ["note 6", "note 5"], ["note 4"]])
+
+    def test_full_last_page_is_followed_by_an_empty_one(self):
+        pages = self.walk(limit=7)
+        self.assertEqual(len(pages[0]), 7)
+        self.assertEqual(pages[1], [])
+
+    def test_tags_and_preview_come_with_the_page(self):
+        result = self.system.list_notes(self.sid, limit=3)
+        note = next(n for n in result["notes"] if n["title"] == "note 1")
+        self.assertEqual(sorted(note["tags"]), ["urgent", "work"])
+        self.assertEqual(note["preview"], "body 1")
+        self.assertNotIn("content", note)
+
+    def test_invalid_cursor_is_rejected(self):
+        result = self.system.list_notes(self.sid, cursor="not-a-cursor")
+        self.assertEqual(result, {"success": False, "message": "Invalid cursor"})
+
+
+class IterUserNotesTest(unittest.TestCase):
+    def test_other_queries_can_run_while_iterating(self):
+        # an in-memory database has a single pooled connection, so a held one would deadlock
+        system = NoteDatabaseSystem(":memory:")
+        self.addCleanup(system.db.close)
+        system.register_user("alice", "secret123")
+        uid = system.db.get_user_id("alice")
+        system.db.create_notes_bulk(uid, [("a", "one", None), ("b", "two", None)])
+        seen = [system.db.get_note_by_title(uid, n["title"])["content"] for n in system.db.iter_user_notes(uid)]
+        self.assertEqual(sorted(seen), ["one", "two"])
+
+
+if __name__ == "__main__":
+    unittest.main()
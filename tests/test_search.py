@@ -0,0 +1,100 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from backend.database import NoteDatabase, _fts_query
+
+
+class FtsQueryTest(unittest.TestCase):
+    def test_words_become_quoted_prefix_terms(self):
+        self.assertEqual(_fts_query("meeting notes"), '"meeting"* "notes"*')
+
+    def test_quotes_are_doubled(self):
+        self.assertEqual(_fts_query('say "hi"'), '"say"* """hi"""*')
+
+
+class SearchNotesTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = NoteDatabase(os.path.join(self.tmp.name, "notes.db"), bcrypt_rounds=4)
+        self.db.create_user("alice", "secret123")
+        self.uid = self.db.get_user_id("alice")
+
+    def tearDown(self):
+        self.db.close()
+        self.tmp.cleanup()
+
+    def titles(self, query):
+        return sorted(r["title"] for r in self.db.search_user_notes(self.uid, query))
+
+    def test_hostile_input_is_matched_literally(self):
+        self.db.create_note(self.uid, "quotes", 'she said "hello" then NEAR( the end')
+        self.db.create_note(self.uid, "plain", "title: nothing special * here")
+        for query in ['"', '""', "*", "NEAR(", "NEAR(a b)", "title:secret", "content:x", "a OR", "-x", "^", "(", ")"]:
+            with self.subTest(query=query):
+                self.db.search_user_notes(self.uid, query)  # must not raise an FTS5 syntax error
+        self.assertEqual(self.titles('"hello"'), ["quotes"])
+        self.assertEqual(self.titles("NEAR("), ["quotes"])
+        self.assertEqual(self.titles("title:"), ["plain"])
+
+    def test_prefix_match(self):
+        self.db.create_note(self.uid, "groceries", "buy apples and bread")
+        self.assertEqual(self.titles("app"), ["groceries"])
+
+    def test_index_follows_insert_update_and_delete(self):
+        self.db.create_note(self.uid, "draft", "first version")
+        self.assertEqual(self.titles("first"), ["draft"])
+        self.assertTrue(self.db.update_note(self.uid, "draft", "second version", "final"))
+        self.assertEqual(self.titles("first"), [])
+        self.assertEqual(self.titles("second"), ["final"])
+        self.assertEqual(self.titles("final"), ["final"])
+        self.assertTrue(self.db.delete_note(self.uid, "final"))
+        self.assertEqual(self.titles("second"), [])
+
+    def test_results_stay_per_user(self):
+        self.db.create_user("bob", "secret123")
+        self.db.create_note(self.db.get_user_id("bob"), "bobs", "shared word")
+        self.db.create_note(self.uid, "alices", "shared word")
+        self.assertEqual(self.titles("shared"), ["alices"])
+
+
+class FtsBackfillTest(unittest.TestCase):
+    def test_existing_notes_are_indexed_on_first_open(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "notes.db")
+            # a database from before the full-text index existed
+            conn = sqlite3.connect(path)
+            conn.executescript("""
+                CREATE TABLE users (
+                  id INTEGER PRIMARY KEY AUTOINCREMENT,
+                  username TEXT UNIQUE NOT NULL,
+                  password_hash BLOB NOT NULL,
+                  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                );
+                CREATE TABLE notes (
+                  id INTEGER PRIMARY KEY AUTOINCREMENT,
+                  user_id INTEGER NOT NULL,
+                  title TEXT NOT NULL,
+                  content TEXT NOT NULL,
+                  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                  modified_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                  reminder_date TEXT,
+                  folder_id INTEGER,
+                  FOREIGN KEY (user_id) REFERENCES users (id),
+                  UNIQUE(user_id, title)
+                );
+                INSERT INTO users (username, password_hash) VALUES ('alice', 'x');
+                INSERT INTO notes (user_id, title, content) VALUES (1, 'old note', 'written before fts');
+            """)
+            conn.close()
+            db = NoteDatabase(path, bcrypt_rounds=4)
+            try:
+                hits = db.search_user_notes(1, "before")
+                self.assertEqual([r["title"] for r in hits], ["old note"])
+            finally:
+                db.close()
+
+
+if __name__ == "__main__":
+    unittest.main()